@@ -1,13 +1,44 @@
+import array
+import os
 import subprocess
+import tempfile
 import tokenizer as tok
 
 '''
-This object is an exception type raised by the ParseTree while parsing.
+Integer tags identifying the kind of a ParseTree node.  Every node class stores its tag in a
+class-level kind attribute, so tree walks can branch on a plain integer comparison rather than
+comparing type objects.  The binary connectives have the largest tags, so kind >= DISJ tests for
+either of them.
+'''
+VAR = 0
+NEG = 1
+DISJ = 2
+CONJ = 3
+
+'''
+The binding strength of each binary connective token, used by the ParseTree parser.
+'''
+_PRECEDENCE = {'->': 1, 'v': 2, '&': 3}
+
+'''
+Stand-ins for the constants true and false among the DIMACS literals used by poly_ncnf.  They are
+infinite, so they are unequal to every real (integer) literal however large its variable ID, and
+are each other's negation, so negating a literal works the same way whether or not it is a
+constant.  They never appear in a CNF's literals.
+'''
+TRUE_LITERAL = float('inf')
+FALSE_LITERAL = -TRUE_LITERAL
+
+'''
+This object is an exception type raised by the ParseTree while parsing.  When raised by a
+ParseTree, position is the index in the formula string of the character at which the error was
+found (the length of the string if the formula ended too early).
 '''
 class ParseError(Exception):
 	
-	def __init__(self, m):
+	def __init__(self, m, position=None):
 		self.message = m
+		self.position = position
 	
 	def __str__(self):
 		return repr(self.message)
@@ -15,7 +46,7 @@ class ParseError(Exception):
 '''
 This object is an abstract syntax tree which parses a boolean expression.  The supported
 connectives and variable names are the same as those supported by tokenizer.tokenize().  This
-object is essentially a recursive descent parser.
+object is essentially an operator-precedence (shunting-yard) parser.
 '''
 class ParseTree:
 	
@@ -34,18 +65,33 @@ class ParseTree:
 	'''
 	def __init__(self, formula):
 		self.__connective_count = 0
-		self.__tokens, valid = tok.tokenize(formula)
+		self.__ncnf = None	#Result of poly_ncnf, computed on first use.
+		self.__flat = None	#Result of flatten, computed on first use.
+		self.__valid = None	#Result of is_valid, computed on first use.
+		tokens, valid = tok.tokenize(formula)
+		self.__tokens = tuple(tokens)
+		self.__n = len(tokens)
+		self.__pos = 0	#Index of the next token to be parsed (or of the one it failed at); __tokens itself never changes.
+		self.__var_ids = set()	#IDs of the variables parsed so far.
+		self.__needs_literalize = False	#Whether some negation is above a connective.
 		if not valid:
-			if len(self.__tokens) > 0:
-				raise ParseError('Invalid token encountered after: \"' + self.__tokens[-1] + '\".')
+			position = tok.token_offsets(formula)[-1]	#The invalid character follows the valid tokens.
+			if self.__n > 0:
+				raise ParseError('Invalid token encountered after: \"' + self.__tokens[-1] + '\".', position)
 			else:
-				raise ParseError('Invalid token at beginning of formula.')
-		elif len(self.__tokens) > 0:
-			self.root = self.__implication()
-			if len(self.__tokens) > 0:
-				raise ParseError('Unparsed tokens in formula.')
+				raise ParseError('Invalid token at beginning of formula.', position)
+		elif self.__n > 0:
+			try:
+				self.root = self.__parse()
+				if self.__pos < self.__n:
+					raise ParseError('Unparsed tokens in formula.')
+			except ParseError as e:
+				offsets = tok.token_offsets(formula)	#Only found on failure, so successful parses never pay for them.
+				e.position = offsets[self.__pos] if self.__pos < self.__n else len(formula)
+				raise
 		else:
 			self.root = None
+		self.__used_vars = tuple(sorted(self.__var_ids))	#Rewriting the tree never adds or removes variables.
 	
 	'''
 	Converts the ParseTree to a string.
@@ -54,44 +100,15 @@ class ParseTree:
 		return str(self.root)
 	
 	'''
-	Pre-increments __connective_count because Python doesn't support unary ++.
-	
-	Returns
-	-------
-	__connective_count : int
-		The value of __connective_count after incrementing.
-	'''
-	def __inc_cc(self):
-		self.__connective_count += 1
-		return self.__connective_count
+	This function parses the tokens from __pos onwards as a formula, stopping at the end of the
+	tokens or at the first token which cannot continue the formula.
 	
-	'''
-	Returns the next token to be parsed.
-	
-	Parameters
-	----------
-	consume : boolean
-		Whether or not to consume the next token.
-	
-	Returns
-	-------
-	token : string
-		The next token.
-	
-	valid : boolean
-		Whether or not the token returned is valid.
-	'''
-	def __next_token(self, consume=False):
-		if len(self.__tokens) > 0:
-			token = self.__tokens[0]
-			if consume:
-				self.__tokens.pop(0)
-			return token, True
-		else:
-			return '', False
-	
-	'''
-	This function parses an implication.
+	Rather than recursing once per grammar rule, the formula is parsed by a single loop with an
+	explicit stack of operands and one of pending operators (a shunting-yard parser), so neither
+	long nor deeply nested formulas exhaust the Python call stack.  Negation binds tightest, then
+	conjunction, disjunction, and implication, and all binary connectives are right-associative.
+	Connectives are numbered in the order they appear.  Negations are built with negate(), so
+	double negations (written out, or from the ~left of an implication) cancel as they are parsed.
 	
 	Returns
 	-------
@@ -102,78 +119,85 @@ class ParseTree:
 	ParseError
 		If an error occurs while parsing the expression.
 	'''
-	def __implication(self):
-		left = self.__disjunction()
-		token, t_valid = self.__next_token()
-		if t_valid and token == '->':
-			self.__next_token(consume=True)
-			return Disjunction(self.__inc_cc(), Negation(left), self.__implication())
-		else:
-			return left
-	
-	'''
-	This function parses a disjunction.
-	
-	See __implication for return values and exceptions raised.
-	'''
-	def __disjunction(self):
-		left = self.__conjunction()
-		token, t_valid = self.__next_token()
-		if t_valid and token == 'v':
-			self.__next_token(consume=True)
-			return Disjunction(self.__inc_cc(), left, self.__disjunction())
-		else:
-			return left
-	
-	'''
-	This function parses a conjunction.
-	
-	See __implication for return values and exceptions raised.
-	'''
-	def __conjunction(self):
-		left = self.__negation()
-		token, t_valid = self.__next_token()
-		if t_valid and token == '&':
-			self.__next_token(consume=True)
-			return Conjunction(self.__inc_cc(), left, self.__conjunction())
-		else:
-			return left
-	
-	'''
-	This function parses a negation.
+	def __parse(self):
+		tokens = self.__tokens
+		n = self.__n
+		pos = self.__pos
+		var_ids = self.__var_ids
+		operands = []
+		operators = []	#Holds '(' and '~' markers, and (precedence, token, connective ID) tuples for binary connectives.
+		while True:
+			#Reads an operand, along with any negations and opening parentheses before it.
+			while True:
+				if pos >= n:
+					self.__pos = pos
+					raise ParseError('No token to parse.')
+				token = tokens[pos]
+				pos += 1
+				if token[0] == 'A':
+					v_id = int(token[1:])
+					var_ids.add(v_id)
+					operands.append(Variable(v_id))
+					break
+				elif token == '~' or token == '(':
+					operators.append(token)
+				else:
+					self.__pos = pos - 1
+					raise ParseError('Unexpected token \"' + token + '\".')
+			
+			#Reads any closing parentheses after the operand, then the next binary connective.
+			while True:
+				while len(operators) > 0 and operators[-1] == '~':
+					if operands[-1].kind >= DISJ:
+						self.__needs_literalize = True
+					operands[-1] = negate(operands[-1])
+					operators.pop()
+				
+				token = tokens[pos] if pos < n else None
+				precedence = _PRECEDENCE.get(token, 0)
+				if precedence == 0:	#The token does not continue this (sub)formula, so finish it.
+					while len(operators) > 0 and operators[-1] != '(':
+						self.__reduce(operands, operators.pop())
+					
+					if len(operators) == 0:
+						self.__pos = pos
+						return operands.pop()
+					elif token == ')':
+						operators.pop()
+						pos += 1
+					else:
+						self.__pos = pos
+						raise ParseError('Non-matching parentheses.')
+				else:
+					while len(operators) > 0 and operators[-1] != '(' and operators[-1][0] > precedence:	#Negations were all applied above, so only '(' markers and binary connectives remain.  Equal precedences are left on the stack, making them right-associative.
+						self.__reduce(operands, operators.pop())
+					pos += 1
+					self.__connective_count += 1
+					operators.append((precedence, token, self.__connective_count))
+					break
 	
-	See __implication for return values and exceptions raised.
 	'''
-	def __negation(self):
-		token, t_valid = self.__next_token()
-		if t_valid and token == '~':
-			self.__next_token(consume=True)
-			return Negation(self.__negation())
-		else:
-			return self.__atom()
+	This function replaces the top two operands with the connective joining them.
 	
-	'''
-	This function parses a variable or parenthesized expression.
+	Parameters
+	----------
+	operands : list
+		The operand stack of __parse.
 	
-	See __implication for return values and exceptions raised.
+	operator : tuple
+		A binary connective from the operator stack of __parse.
 	'''
-	def __atom(self):
-		token, t_valid = self.__next_token(consume=True)
-		if t_valid:
-			if token[0] == 'A':
-				return Variable(int(token[1:]))
-			elif token == '(':
-				expr = self.__implication()
-				right_paren, rp_valid = self.__next_token()
-				if rp_valid and right_paren == ')':
-					self.__next_token(consume=True)
-					return expr
-				else:
-					raise ParseError('Non-matching parentheses.')
-			else:
-				raise ParseError('Unexpected token \"' + token + '\".')
-		else:
-			raise ParseError('No token to parse.')
+	def __reduce(self, operands, operator):
+		right = operands.pop()
+		left = operands.pop()
+		if operator[1] == '&':
+			operands.append(Conjunction(operator[2], left, right))
+		elif operator[1] == 'v':
+			operands.append(Disjunction(operator[2], left, right))
+		else:	#Implication, as ~left v right.
+			if left.kind >= DISJ:
+				self.__needs_literalize = True
+			operands.append(Disjunction(operator[2], negate(left), right))
 	
 	'''
 	This function replaces the parent of a node.
@@ -191,12 +215,12 @@ class ParseTree:
 	'''
 	def __replace_parent(self, node, new_parent=None, left_child=True):
 		if new_parent is not None:
-			if type(new_parent) == Disjunction or type(new_parent) == Conjunction:
+			if new_parent.kind >= DISJ:
 				if left_child:
 					new_parent.left = node
 				else:
 					new_parent.right = node
-			elif type(new_parent) == Negation:
+			elif new_parent.kind == NEG:
 				new_parent.expression = node
 		else:
 			self.root = node
@@ -220,117 +244,239 @@ class ParseTree:
 	def __count_negations(self, first_node):
 		negations = 0
 		final_node = first_node
-		while type(final_node) == Negation:
+		while final_node.kind == NEG:
 			final_node = final_node.expression
 			negations += 1
 		return negations, final_node
 	
 	'''
-	This function returns a list of variable IDs used in a ParseTree.
+	This function returns the variable IDs used in a ParseTree.  They are collected while parsing,
+	so no walk over the tree is needed.
 	
 	Returns
 	-------
-	used_vars : list
-		A list of integer IDs for each variable used in the ParseTree.
+	used_vars : tuple
+		The integer IDs of each variable used in the ParseTree, in increasing order.
 	'''
 	def used_variables(self):
-		used_vars = []
-		if self.root is not None:
-			stack = [self.root]
-			while len(stack) > 0:
-				current = stack.pop()
-				non_negation = self.__count_negations(current)[1]
-				if type(non_negation) != Variable:
-					stack.extend([non_negation.left, non_negation.right])
-				else:
-					used_vars.append(non_negation.original_id())
-		return used_vars
+		return self.__used_vars
+	
+	'''
+	This function returns the ParseTree as a structure of arrays, with one entry per distinct
+	subformula in post-order (every entry comes after its children, and the root is last).  Walks
+	over the flattened tree are plain loops over contiguous integer arrays rather than pointer
+	chasing through node objects.
+	
+	The entries are hash-consed: structurally equal subformulas, up to the order of the operands
+	of a binary connective, share one entry.  The result is therefore a DAG in which an entry may
+	be the child of several others, and a walk over it evaluates each shared subformula only once.
+	
+	The result is computed once and then reused, like poly_ncnf's, so it should not be modified.
+	
+	Returns
+	-------
+	kinds : array
+		The kind (VAR, NEG, DISJ, or CONJ) of each entry.
+	
+	lefts : array
+		The index of the left child of each binary connective, or -1.
+	
+	rights : array
+		The index of the right child of each binary connective or the operand of each negation,
+		or -1.
+	
+	ids : list
+		The variable ID of each variable, the connective ID of (the first occurrence of) each
+		binary connective, or 0.  Variable IDs are unbounded, so unlike the others this is a plain
+		list rather than a fixed-width array.
+	'''
+	def flatten(self):
+		if self.__flat is None:
+			kinds = array.array('b')
+			lefts = array.array('i')
+			rights = array.array('i')
+			ids = []
+			if self.root is not None:
+				interned = {}	#Maps the structure of each entry to its index.
+				indices = []	#The indices of the nodes visited so far whose parents have not been added yet.
+				stack = [(self.root, False)]	#Tuple details: (node, children-already-visited).
+				while len(stack) > 0:
+					current, visited = stack.pop()
+					kind = current.kind
+					if kind == VAR:
+						left, right, ref = -1, -1, current.var_id
+						key = (kind, ref)
+					elif not visited:
+						stack.append((current, True))
+						if kind == NEG:
+							stack.append((current.expression, False))
+						else:
+							stack.append((current.right, False))
+							stack.append((current.left, False))
+						continue
+					elif kind == NEG:
+						left, right, ref = -1, indices.pop(), 0
+						key = (kind, right)
+					else:
+						right = indices.pop()
+						left = indices.pop()
+						ref = current.connective_id
+						key = (kind, left, right) if left <= right else (kind, right, left)
+					
+					index = interned.get(key)
+					if index is None:
+						index = len(kinds)
+						interned[key] = index
+						kinds.append(kind)
+						lefts.append(left)
+						rights.append(right)
+						ids.append(ref)
+					indices.append(index)
+			self.__flat = (kinds, lefts, rights, ids)
+		return self.__flat
+	
+	'''
+	This function discards the stored results of poly_ncnf(), flatten(), and is_valid(), so the
+	next calls compute them again, and makes the next literalize() walk the tree.  It should be
+	called after changing the nodes of the tree by hand, or before timing any of those functions.
+	'''
+	def clear_cache(self):
+		self.__ncnf = None
+		self.__flat = None
+		self.__valid = None
+		self.__needs_literalize = True
 	
 	'''
 	This function descends the ParseTree, applies De Morgan's laws, and simplifies double negations.
 	
-	This has the effect of pushing all negations down to the variables.
+	This has the effect of pushing all negations down to the variables.  Every node is visited
+	once: each one carries down whether an odd number of negations lie above it, and is either
+	kept or replaced by its De Morgan dual accordingly.
+	
+	The parser notes whether any negation lies above a connective, so when none does (including
+	after a previous call) the tree is left as it is without being walked.  After changing the
+	nodes of the tree by hand, call clear_cache() so the next call walks it again.
 	'''
 	def literalize(self):
-		stack = [(self.root, None, True)]	#Tuple details: (node, parent, node-is-left-child).
+		if not self.__needs_literalize:
+			return
+		self.clear_cache()	#The tree is about to change.
+		self.__needs_literalize = False
+		stack = [(self.root, False, None, True)] if self.root is not None else []	#Tuple details: (node, node-is-negated, new-parent, node-is-left-child).
 		while len(stack) > 0:
-			current = stack.pop()
-			n_count, non_negation = self.__count_negations(current[0])
-			if n_count % 2 == 0:
-				self.__replace_parent(non_negation, current[1], current[2])
-			else:
-				if type(non_negation) == Disjunction:
-					self.__replace_parent(Conjunction(non_negation.original_id(), Negation(non_negation.left), Negation(non_negation.right)), current[1], current[2])
-				elif type(non_negation) == Conjunction:
-					self.__replace_parent(Disjunction(non_negation.original_id(), Negation(non_negation.left), Negation(non_negation.right)), current[1], current[2])
-				else:
-					self.__replace_parent(non_negation, current[0])
+			current, negated, parent, left_child = stack.pop()
+			while current.kind == NEG:
+				current = current.expression
+				negated = not negated
 			
-			if type(non_negation) == Disjunction or type(non_negation) == Conjunction:
-				if current[1] is not None:
-					if current[2]:
-						stack.extend([(current[1].left.left, current[1].left, True), (current[1].left.right, current[1].left, False)])
-					else:
-						stack.extend([(current[1].right.left, current[1].right, True), (current[1].right.right, current[1].right, False)])
+			if current.kind == VAR:
+				new_node = Negation(current) if negated else current
+			else:
+				if not negated:
+					new_node = current	#Its children are replaced as they are visited.
+				elif current.kind == DISJ:
+					new_node = Conjunction(current.connective_id, None, None)
 				else:
-					stack.extend([(self.root.left, self.root, True), (self.root.right, self.root, False)])
+					new_node = Disjunction(current.connective_id, None, None)
+				stack.append((current.right, negated, new_node, False))
+				stack.append((current.left, negated, new_node, True))
+			self.__replace_parent(new_node, parent, left_child)
 	
 	'''
-	This function returns a new ParseTree which is the negation of the current ParseTree in CNF.
-	The space of the resulting ParseTree is polynomial with respect to the original.
+	This function returns the negation of the current ParseTree in CNF.  The space of the result
+	is polynomial with respect to the original.
+	
+	The clauses are produced by a single post-order pass over the tree.  Connectives are numbered
+	by their IDs and variables follow after all connectives.  Negations are not pushed down first;
+	they only flip the sign of the literal which stands for the node below them.  Connectives are
+	simplified using their children's literals before being encoded (phi v phi = phi,
+	phi v ~phi = T, phi v T = T, phi v F = phi, and the duals for conjunction), and a simplified
+	connective produces no clauses.  Connectives of the same kind over the same literals are
+	encoded once and share a literal, which also lets the rules above apply to equal subformulas
+	written out more than once.
+	
+	The result is computed once and then reused by later calls (including those made by is_valid),
+	so it should not be modified.  literalize() discards the stored result, but changing the nodes
+	of the tree by hand does not (see clear_cache()).
 	
 	Returns
 	-------
-	new_tree : ParseTree
-		A new ParseTree in CNF corresponding to the negation of the original.
+	ncnf : CNF
+		The clauses of a CNF formula corresponding to the negation of the original.
 	'''
 	def poly_ncnf(self):
-		new_tree = ParseTree('')	#Creates an empty tree.
+		if self.__ncnf is not None:
+			return self.__ncnf
+		
+		ncnf = CNF()
 		if self.root is not None:
-			literalized_self = ParseTree(str(self))
-			assert(self.__connective_count == literalized_self.__connective_count)
-			literalized_self.literalize()
-			
-			proper_root = literalized_self.__count_negations(literalized_self.root)[1]
-			new_tree.root = Negation(Variable(proper_root.original_id())) if type(proper_root) != Variable else Negation(Variable(literalized_self.__connective_count + proper_root.original_id()))	#This variable represents ~A_all.
-			
-			stack = [literalized_self.root]
+			cc = self.__connective_count
+			literals_out = ncnf.literals
+			max_var = 0
+			literals = []	#The literals of the nodes visited so far whose parents have not been encoded yet.
+			gates = {}	#Maps (kind, left literal, right literal) to the literal of each encoded connective.
+			stack = [(self.root, False)]	#Tuple details: (node, children-already-visited).
 			while len(stack) > 0:
-				current = stack.pop()
-				if type(current) == Disjunction or type(current) == Conjunction:
-					x_current = Variable(current.original_id())
-					
-					ln_count, left = literalized_self.__count_negations(current.left)
-					x_left = Variable(left.original_id()) if type(left) != Variable else Variable(literalized_self.__connective_count + left.original_id())
-					if ln_count % 2 == 1:
-						x_left = Negation(x_left)
-					
-					rn_count, right = literalized_self.__count_negations(current.right)
-					x_right = Variable(right.original_id()) if type(right) != Variable else Variable(literalized_self.__connective_count + right.original_id())
-					if rn_count % 2 == 1:
-						x_right = Negation(x_right)
-					
-					if type(current) == Disjunction:
-						clause_1 = Disjunction(new_tree.__inc_cc(), Negation(x_current), Disjunction(new_tree.__inc_cc(), x_left, x_right))	#False & False -> False
-						clause_2 = Disjunction(new_tree.__inc_cc(), x_current, Disjunction(new_tree.__inc_cc(), x_left, Negation(x_right)))	#False & True -> True
-						clause_3 = Disjunction(new_tree.__inc_cc(), x_current, Disjunction(new_tree.__inc_cc(), Negation(x_left), x_right))	#True & False -> True
-						clause_4 = Disjunction(new_tree.__inc_cc(), x_current, Disjunction(new_tree.__inc_cc(), Negation(x_left), Negation(x_right)))	#True / True -> True
-						new_tree.root = Conjunction(new_tree.__inc_cc(), clause_1, Conjunction(new_tree.__inc_cc(), clause_2, Conjunction(new_tree.__inc_cc(), clause_3, Conjunction(new_tree.__inc_cc(), clause_4, new_tree.root))))
-					else:	#Implicity means current is a Conjunction.
-						clause_1 = Disjunction(new_tree.__inc_cc(), Negation(x_current), Disjunction(new_tree.__inc_cc(), x_left, x_right))	#False & False -> False
-						clause_2 = Disjunction(new_tree.__inc_cc(), Negation(x_current), Disjunction(new_tree.__inc_cc(), x_left, Negation(x_right)))	#False & True -> False
-						clause_3 = Disjunction(new_tree.__inc_cc(), Negation(x_current), Disjunction(new_tree.__inc_cc(), Negation(x_left), x_right))	#True & False -> False
-						clause_4 = Disjunction(new_tree.__inc_cc(), x_current, Disjunction(new_tree.__inc_cc(), Negation(x_left), Negation(x_right)))	#True & True -> True
-						new_tree.root = Conjunction(new_tree.__inc_cc(), clause_1, Conjunction(new_tree.__inc_cc(), clause_2, Conjunction(new_tree.__inc_cc(), clause_3, Conjunction(new_tree.__inc_cc(), clause_4, new_tree.root))))
-					
-					if type(left) == Disjunction or type(left) == Conjunction:
-						stack.append(left)
+				current, visited = stack.pop()
+				kind = current.kind
+				if kind == VAR:
+					literals.append(cc + current.var_id)
+				elif not visited:
+					stack.append((current, True))
+					if kind == NEG:
+						stack.append((current.expression, False))
+					else:
+						stack.append((current.right, False))
+						stack.append((current.left, False))
+				elif kind == NEG:
+					literals.append(-literals.pop())	#Also turns TRUE_LITERAL into FALSE_LITERAL and vice versa.
+				else:
+					x_right = literals.pop()
+					x_left = literals.pop()
+					if kind == DISJ:
+						absorbing, identity = TRUE_LITERAL, FALSE_LITERAL
+					else:
+						absorbing, identity = FALSE_LITERAL, TRUE_LITERAL
 					
-					if type(right) == Disjunction or type(right) == Conjunction:
-						stack.append(right)
+					if x_left == x_right or x_right == identity:
+						literals.append(x_left)
+					elif x_left == identity:
+						literals.append(x_right)
+					elif x_left == -x_right or x_left == absorbing or x_right == absorbing:
+						literals.append(absorbing)
+					elif (kind, x_left, x_right) in gates:	#An equal connective was encoded already, so reuse its literal.
+						literals.append(gates[(kind, x_left, x_right)])
+					else:
+						x_current = current.connective_id
+						gates[(kind, x_left, x_right)] = x_current
+						gates[(kind, x_right, x_left)] = x_current
+						nx_current = -x_current
+						nx_left = -x_left
+						nx_right = -x_right
+						#One clause per row of the connective's truth table, in the order FF, FT, TF, TT.
+						#Only the sign of x_current differs between the two connectives.
+						if kind == DISJ:
+							literals_out.extend((nx_current, x_left, x_right, 0, x_current, x_left, nx_right, 0, x_current, nx_left, x_right, 0, x_current, nx_left, nx_right, 0))
+						else:
+							literals_out.extend((nx_current, x_left, x_right, 0, nx_current, x_left, nx_right, 0, nx_current, nx_left, x_right, 0, x_current, nx_left, nx_right, 0))
+						literals.append(x_current)
+						
+						if max_var < abs(x_left):	#Variables are numbered after every connective, so only they can raise the maximum.
+							max_var = abs(x_left)
+						if max_var < abs(x_right):
+							max_var = abs(x_right)
+			
+			root_literal = literals.pop()
+			if root_literal == TRUE_LITERAL:
+				literals_out.append(0)	#The formula is a tautology, so its negation is the empty clause.
+			elif root_literal != FALSE_LITERAL:	#If the formula is a contradiction, its negation needs no clauses.
+				literals_out.extend((-root_literal, 0))	#This clause represents ~A_all.
+				if max_var < abs(root_literal):
+					max_var = abs(root_literal)
+			ncnf.max_var = max_var
 		
-		new_tree.literalize()	#Used for simplifying the double negations that might appear on some variables.
-		return new_tree
+		self.__ncnf = ncnf
+		return ncnf
 	
 	'''
 	Converts a ParseTree in (literalized) CNF to the DIMACS format.
@@ -350,37 +496,44 @@ class ParseTree:
 		stack = [self.root]
 		while len(stack) > 0:
 			current = stack.pop()
-			if type(current) == Conjunction:
+			if current.kind == CONJ:
 				stack.extend([current.left, current.right])
 			else:
 				clauses.append(current)
 		
 		max_var = 0
-		dimacs_formula = ''
+		dimacs_parts = []	#Joined once at the end, rather than growing a string one literal at a time.
 		for c in clauses:
 			clause_stack = [c]
 			while len(clause_stack) > 0:
 				current = clause_stack.pop()
-				if type(current) == Disjunction:
+				if current.kind == DISJ:
 					clause_stack.extend([current.left, current.right])
-				elif type(current) == Conjunction:
+				elif current.kind == CONJ:
 					raise ValueError('Formula is not in CNF.')
 				else:
 					n_count, non_negation = self.__count_negations(current)
-					if max_var < non_negation.original_id():
-						max_var = non_negation.original_id()
+					var_id = non_negation.original_id()
+					if max_var < var_id:
+						max_var = var_id
 					if n_count % 2 == 0:
-						dimacs_formula += str(non_negation.original_id()) + ' '
+						dimacs_parts.append(str(var_id) + ' ')
 					else:
-						dimacs_formula += '-' + str(non_negation.original_id()) + ' '
-			dimacs_formula += '0\n'
+						dimacs_parts.append('-' + str(var_id) + ' ')
+			dimacs_parts.append('0\n')
 		
-		return 'p cnf ' + str(max_var) + ' ' + str(len(clauses)) + '\n' + dimacs_formula
+		return 'p cnf ' + str(max_var) + ' ' + str(len(clauses)) + '\n' + ''.join(dimacs_parts)
 	
 	'''
 	Checks whether or not the ParseTree is valid using minisat.  Note that minisat is assumed to
 	be installed and available either in the current working directory, or through the PATH variable.
 	
+	Minisat's input and output go through temporary files (in /dev/shm when it exists) which are
+	removed afterwards, so several checks may run at once from any working directory.
+	
+	Minisat is only run on the first call; later calls reuse its result, each with a new copy of
+	the assignments.
+	
 	Returns
 	-------
 	is_valid : boolean
@@ -396,81 +549,196 @@ class ParseTree:
 		If minisat returns an unrecognized return code.
 	'''
 	def is_valid(self):
-		with open('minisat_in.txt', 'w') as mini_in, open('minisat_out.txt', 'w') as mini_out:	#First we need to ready the input, and clear the output file.
-			mini_in.write(self.poly_ncnf().dimacs())
+		if self.__valid is None:
+			self.__valid = self.__run_minisat()
+		validity, var_assigns = self.__valid
+		return validity, dict(var_assigns)	#Changing the returned assignments leaves the stored ones intact.
+	
+	'''
+	This function runs minisat on the NCNF of the ParseTree, for is_valid.
+	'''
+	def __run_minisat(self):
+		dimacs_formula = self.poly_ncnf().dimacs()
+		temp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None	#Keeps minisat's files in memory where a tmpfs is available.
+		with tempfile.NamedTemporaryFile('w', suffix='.cnf', dir=temp_dir, delete=False) as mini_in:
+			mini_in.write(dimacs_formula)
+		out_handle, out_path = tempfile.mkstemp(suffix='.out', dir=temp_dir)
+		os.close(out_handle)
 		
-		minisat = subprocess.Popen(['minisat', 'minisat_in.txt', 'minisat_out.txt'], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-		minisat.communicate()
-		if minisat.returncode == 20:
-			return True, {}
-		elif minisat.returncode == 10:
-			with open('minisat_out.txt', 'r') as mini_out:
-				var_assigns = {}
-				used_vars = self.used_variables()
-				for var in mini_out.read().split()[1:]:
-					int_var = int(var)
-					if (abs(int_var) - self.__connective_count) in used_vars:
-						if int_var > 0:
-							var_assigns[int_var - self.__connective_count] = True
-						elif int_var < 0:
-							var_assigns[-int_var - self.__connective_count] = False
-				return False, var_assigns
+		try:
+			minisat = subprocess.run(['minisat', mini_in.name, out_path], stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)	#The results are read from out_path, not minisat's output.
+			if minisat.returncode == 20:
+				return True, {}
+			elif minisat.returncode == 10:
+				with open(out_path, 'r') as mini_out:
+					used_vars = self.__var_ids
+					var_assigns = {v: False for v in self.__used_vars}	#Variables simplified out of the CNF do not affect the formula.
+					cc = self.__connective_count	#Formula variables follow the connectives in the CNF's numbering.
+					model = iter(mini_out.read().split())
+					next(model, None)	#Skips the leading 'SAT'.
+					for var in model:
+						int_var = int(var)
+						var_id = (int_var if int_var > 0 else -int_var) - cc
+						if var_id in used_vars:
+							var_assigns[var_id] = int_var > 0
+					return False, var_assigns
+			else:
+				raise IOError('Minisat returned unknown code.')
+		finally:
+			os.remove(mini_in.name)
+			os.remove(out_path)
+
+'''
+This object holds a formula in CNF as a flat list of integer literals, in which each clause is
+terminated by a 0 as in the DIMACS format (a negative literal is a negated variable).  Keeping
+the clauses in one list of ints avoids creating an object per clause.
+'''
+class CNF:
+	
+	'''
+	Initializes a new CNF with no clauses.
+	'''
+	def __init__(self):
+		self.literals = []
+		self.max_var = 0
+	
+	'''
+	Returns the number of clauses in the CNF.
+	
+	Returns
+	-------
+	clause_count : int
+		The number of clauses.
+	'''
+	def clause_count(self):
+		return self.literals.count(0)
+	
+	'''
+	Converts the CNF to the DIMACS format, with one clause per line.
+	
+	Returns
+	-------
+	dimacs_formula : string
+		The CNF in the DIMACS format.
+	'''
+	def dimacs(self):
+		body = ' '.join(map(str, self.literals)).replace(' 0 ', ' 0\n')	#Only clause-terminating 0s are standalone tokens, so this starts each clause on a new line.
+		return 'p cnf ' + str(self.max_var) + ' ' + str(self.clause_count()) + '\n' + body + ('\n' if len(body) > 0 else '')
+
+'''
+Converts a ParseTree node, and everything below it, to a string.
+
+The tree is walked with an explicit stack, so deeply nested formulas neither recurse once per
+node nor build an intermediate string for every subformula.
+
+Parameters
+----------
+node : Disjunction, Conjunction, Negation, or Variable
+	The node to convert.
+
+Returns
+-------
+node_str : string
+	The formula at the node, fully parenthesized.
+'''
+def to_string(node):
+	out = []
+	stack = [node]	#Holds nodes still to be converted, and string fragments to be emitted as-is.
+	while len(stack) > 0:
+		current = stack.pop()
+		if type(current) == str:
+			out.append(current)
+		elif current.kind == VAR:
+			out.append('A' + str(current.var_id))
+		elif current.kind == NEG:
+			out.append('~')
+			stack.append(current.expression)
 		else:
-			raise IOError('Minisat returned unknown code.')
+			out.append('(')
+			stack.extend([')', current.right, ' v ' if current.kind == DISJ else ' & ', current.left])
+	return ''.join(out)
+
+'''
+Negates a ParseTree node, cancelling a negation already on it rather than stacking another.
+
+Parameters
+----------
+node : Disjunction, Conjunction, Negation, or Variable
+	The node to negate.
+
+Returns
+-------
+negated_node : Disjunction, Conjunction, Negation, or Variable
+	A new Negation of node, or the node below it if node is a Negation.
+'''
+def negate(node):
+	return node.expression if node.kind == NEG else Negation(node)
 
 '''
 This object represents a disjunction node (internal) in a ParseTree.
 '''
 class Disjunction:
 	
+	__slots__ = ('connective_id', 'left', 'right')
+	kind = DISJ
+	
 	def __init__(self, c_id, l, r):
-		self.connective_id = 2 * c_id + 1
+		self.connective_id = c_id
 		self.left = l
 		self.right = r
 	
 	def __str__(self):
-		return '(' + str(self.left) + ' v ' + str(self.right) + ')'
+		return to_string(self)
 	
 	def original_id(self):
-		return (self.connective_id - 1) // 2
+		return self.connective_id
 
 '''
 This object represents a conjunction node (internal) in a ParseTree.
 '''
 class Conjunction:
 	
+	__slots__ = ('connective_id', 'left', 'right')
+	kind = CONJ
+	
 	def __init__(self, c_id, l, r):
-		self.connective_id = 2 * c_id + 1
+		self.connective_id = c_id
 		self.left = l
 		self.right = r
 	
 	def __str__(self):
-		return '(' + str(self.left) + ' & ' + str(self.right) + ')'
+		return to_string(self)
 	
 	def original_id(self):
-		return (self.connective_id - 1) // 2
+		return self.connective_id
 
 '''
 This object represents a negation node (internal) in a ParseTree.
 '''
 class Negation:
 	
+	__slots__ = ('expression',)
+	kind = NEG
+	
 	def __init__(self, e):
 		self.expression = e
 	
 	def __str__(self):
-		return '~' + str(self.expression)
+		return to_string(self)
 
 '''
 This object represents a variable node (a leaf) in a ParseTree.
 '''
 class Variable:
 	
+	__slots__ = ('var_id',)
+	kind = VAR
+	
 	def __init__(self, v_id):
-		self.var_id = 2 * v_id
+		self.var_id = v_id
 	
 	def __str__(self):
-		return 'A' + str(self.var_id // 2)
+		return 'A' + str(self.var_id)
 	
 	def original_id(self):
-		return self.var_id // 2
+		return self.var_id
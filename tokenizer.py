@@ -1,5 +1,13 @@
 import re
 
+'''
+Matches one piece of a boolean formula: a run of whitespace (no group), a valid token (group 1),
+or any other single character, which makes the formula invalid (group 2).  Every character of a
+formula is covered by exactly one match, so scanning with finditer tokenizes the whole string in
+one pass.
+'''
+_TOKEN_RE = re.compile(r'\s+|(->|[()~&v]|A[1-9][0-9]*)|(.)', re.DOTALL)
+
 '''
 Tokenizes a boolean formula expressed as a string.
 
@@ -22,28 +30,37 @@ valid : boolean
 '''
 def tokenize(formula_str):
 	tokens = []
-	working_str = formula_str.lstrip()
-	while(len(working_str) > 0):
-		next_ch = working_str[0]
-		if next_ch == '(' or next_ch == ')' or next_ch == '~' or next_ch == '&' or next_ch == 'v':
-			tokens.append(next_ch)
-			working_str = working_str[1:]
-		elif len(working_str) > 1:
-			if next_ch == '-' and working_str[1] == '>':
-				tokens.append('->')
-				working_str = working_str[2:]
-			elif next_ch == 'A':
-				var_num = re.match('[1-9][0-9]*', working_str[1:])	# Note that match(...) checks at the beginning of the string.
-				if var_num is not None:
-					tokens.append('A' + var_num.group())
-					working_str = working_str[(1 + var_num.span()[1]):]
-				else:
-					return tokens, False
-			else:
-				return tokens, False
-		else:
+	for token_match in _TOKEN_RE.finditer(formula_str):
+		group = token_match.lastindex
+		if group == 1:
+			tokens.append(token_match.group(1))
+		elif group == 2:
 			return tokens, False
-		
-		working_str = working_str.lstrip()
 	
 	return tokens, True
+
+'''
+Finds where each token of a boolean formula starts, for reporting the position of errors.
+
+Parameters
+----------
+formula_str : string
+	A boolean formula expressed as a string.
+
+Returns
+-------
+offsets : list
+	The index in formula_str of the first character of each token returned by tokenize(formula_str),
+	followed by the index of the invalid character if the formula could not be tokenized.
+
+'''
+def token_offsets(formula_str):
+	offsets = []
+	for token_match in _TOKEN_RE.finditer(formula_str):
+		group = token_match.lastindex
+		if group is not None:
+			offsets.append(token_match.start())
+			if group == 2:
+				break
+	
+	return offsets
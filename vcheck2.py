@@ -1,4 +1,3 @@
-import collections
 import parse_tree as pt
 
 if __name__ == '__main__':
@@ -9,11 +8,8 @@ if __name__ == '__main__':
 			if value:
 				print('Formula IS valid.')
 			else:
-				sorted_assign = collections.OrderedDict(sorted(assign.items(), key=lambda kv_pair: kv_pair[0]))
-				for x in sorted_assign:
-					sorted_assign[x] = 'T' if sorted_assign[x] else 'F'
 				#Modified from https://codereview.stackexchange.com/questions/7953/flattening-a-dictionary-into-a-string
-				print(', '.join("A{!s} = {!s}".format(key,val) for (key,val) in sorted_assign.items()))
+				print(', '.join("A{!s} = {!s}".format(key, 'T' if val else 'F') for (key, val) in sorted(assign.items())))	#The keys are unique, so the pairs sort by key alone.
 		except pt.ParseError as e:
 			print('Incorrectly formatted formula: ' + e.message)
 	else:
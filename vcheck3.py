@@ -1,4 +1,4 @@
-import collections
+import bisect
 import parse_tree as pt
 
 if __name__ == '__main__':
@@ -12,32 +12,30 @@ if __name__ == '__main__':
 		formula = inputs[-1]
 		axioms = inputs[:(len(inputs) - 1)]
 		
-		full_formula = ''
 		if len(axioms) > 0:
-			for i, a in enumerate(axioms):
-				full_formula += '(' + a + ')'
-				if i < len(axioms) - 1:
-					full_formula += '&'
-			full_formula += '->'
-		full_formula += '(' + formula + ')'
+			full_formula = '&'.join('(' + a + ')' for a in axioms) + '->(' + formula + ')'
+		else:
+			full_formula = '(' + formula + ')'
+		
+		starts = []	#The index in full_formula at which each input begins, in the same order as inputs.
+		start = 1
+		for a in axioms:
+			starts.append(start)
+			start += len(a) + 3	#Skips the axiom, its closing parenthesis, and the '&(' after it.
+		starts.append(len(full_formula) - len(formula) - 1)
 		
 		try:
 			validity, assignments = pt.ParseTree(full_formula).is_valid()
 			if validity:
 				print('Formula IS valid given the axioms.')
 			else:
-				assignments_str = ''
-				sorted_assignments = collections.OrderedDict(sorted(assignments.items(), key=lambda kv_pair: kv_pair[0]))
-				for i, (k, v) in enumerate(sorted_assignments.items()):
-					assignments_str += 'A' + str(k) + ' = ' + ('T' if v else 'F')
-					if i < len(sorted_assignments) - 1:
-						assignments_str += ', '
-				print(assignments_str)
+				print(', '.join('A' + str(k) + ' = ' + ('T' if v else 'F') for (k, v) in sorted(assignments.items())))	#The keys are unique, so the pairs sort by key alone.
 		except pt.ParseError as e:
+			hint = max(bisect.bisect_right(starts, e.position) - 1, 0)	#The input the error was found in, or just after.
 			user_error = False
-			for i, f in enumerate(inputs):
+			for i in range(hint + 1):	#Reports the first input which fails alone, as an earlier one (e.g. with an unclosed parenthesis) may be what made the hint fail.  Inputs after the hint were not reached, so cannot be the first.
 				try:
-					pt.ParseTree(f)
+					pt.ParseTree(inputs[i])
 				except pt.ParseError as e_user:
 					print('Formula ' + str(i + 1) + ' was formatted incorrectly: ' + e_user.message)
 					user_error = True
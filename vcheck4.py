@@ -3,35 +3,123 @@ import collections
 import parse_tree as pt
 
 '''
-This function evaluates whether or not the boolean formula represented by a node in a ParseTree
-is true or not given a set of bindings.
+This function compiles a flattened ParseTree into a Python function which evaluates whether or
+not the formula is true given a list of bindings.
+
+The function is generated as straight-line source with one assignment per node in post-order,
+and compiled once.  Each evaluation then runs as a single Python function without looping over,
+unpacking, or dispatching on the nodes of the tree.
 
 Parameters
 ----------
-tree : Disjunction, Conjunction, Negation, or Variable.
-	The ParseTree node to evaluate.
+flat_tree : tuple
+	The arrays returned by ParseTree.flatten() for a non-empty ParseTree.
 
-bindings : dictionary
-	A dictionary that maps the integer ID of every variable in a ParseTree to a true or false value.
+var_ids : tuple
+	The integer IDs of the variables used in the ParseTree.
 
 Returns
 -------
-satisfiability : boolean
-	Whether or not the set of bindings satisfies the formula at the node.
+evaluate : function
+	A function taking a list which holds a true or false value for each variable, in the order of
+	var_ids, and returning whether or not those bindings satisfy the formula.
 '''
-def __eval_node(node, bindings):
-	if type(node) == pt.Disjunction:
-		return __eval_node(node.left, bindings) or __eval_node(node.right, bindings)
-	elif type(node) == pt.Conjunction:
-		return __eval_node(node.left, bindings) and __eval_node(node.right, bindings)
-	elif type(node) == pt.Negation:
-		return not __eval_node(node.expression, bindings)
-	elif type(node) == pt.Variable:
-		return bindings[node.original_id()]
+def __compile_tree(flat_tree, var_ids):
+	var_to_index = {var: i for i, var in enumerate(var_ids)}	#Only used while generating the source.
+	kinds, lefts, rights, ids = flat_tree
+	lines = ['def evaluate(bindings):']
+	for i in range(len(kinds)):
+		kind = kinds[i]
+		if kind == pt.VAR:
+			lines.append('\tv' + str(i) + ' = bindings[' + str(var_to_index[ids[i]]) + ']')
+		elif kind == pt.NEG:
+			lines.append('\tv' + str(i) + ' = not v' + str(rights[i]))
+		elif kind == pt.DISJ:
+			lines.append('\tv' + str(i) + ' = v' + str(lefts[i]) + ' or v' + str(rights[i]))
+		else:
+			lines.append('\tv' + str(i) + ' = v' + str(lefts[i]) + ' and v' + str(rights[i]))
+	lines.append('\treturn v' + str(len(kinds) - 1))
+	
+	namespace = {}
+	exec(compile('\n'.join(lines), '<formula>', 'exec'), namespace)
+	return namespace['evaluate']
+
+'''
+The largest number of variables for which brute_force_validity evaluates all assignments at once
+as bitsets.  Each bitset has one bit per assignment, so this bounds them at 2 ** 20 bits (128 KiB).
+'''
+BITSET_MAX_VARIABLES = 20
+
+'''
+This function evaluates a flattened ParseTree under every assignment of its variables at once.
+
+Every value is an integer used as a bitset with one bit per assignment: bit k is the value under
+the assignment in which the i-th variable is true exactly when bit i of k is set.  The
+connectives then become the bitwise operators on these integers, which CPython applies a whole
+machine word (64 assignments) at a time.
+
+Parameters
+----------
+flat_tree : tuple
+	The arrays returned by ParseTree.flatten() for a non-empty ParseTree.
+
+var_ids : tuple
+	The integer IDs of the variables used in the ParseTree.
+
+Returns
+-------
+truth_table : int
+	The bitset of assignments which satisfy the formula.
+
+all_assignments : int
+	The bitset of every assignment.
+'''
+def __eval_tree_bitset(flat_tree, var_ids):
+	assignment_count = 2 ** len(var_ids)
+	all_assignments = (1 << assignment_count) - 1
+	columns = {}
+	for i, var in enumerate(var_ids):
+		period = 2 << i	#Within each period of assignments, the variable is false for the first half and true for the second.
+		column = ((1 << (period // 2)) - 1) << (period // 2)
+		while period < assignment_count:
+			column |= column << period
+			period *= 2
+		columns[var] = column
+	
+	kinds, lefts, rights, ids = flat_tree
+	uses = [0] * len(kinds)	#The number of parents of each node which have not been evaluated yet.
+	for i in range(len(kinds)):
+		if kinds[i] != pt.VAR:
+			uses[rights[i]] += 1
+			if kinds[i] != pt.NEG:
+				uses[lefts[i]] += 1
+	
+	values = [None] * len(kinds)	#Nodes may be shared, so each value is kept until its last parent is evaluated.
+	for i in range(len(kinds)):
+		kind = kinds[i]
+		if kind == pt.VAR:
+			values[i] = columns[ids[i]]
+			continue
+		right = rights[i]
+		if kind == pt.NEG:
+			values[i] = values[right] ^ all_assignments
+		else:
+			left = lefts[i]
+			values[i] = values[left] | values[right] if kind == pt.DISJ else values[left] & values[right]
+			uses[left] -= 1
+			if uses[left] == 0:
+				values[left] = None
+		uses[right] -= 1
+		if uses[right] == 0:
+			values[right] = None
+	return values[-1], all_assignments
 
 '''
 This function tests the validity of a boolean formula by brute-force.
 
+Formulas with at most BITSET_MAX_VARIABLES variables are evaluated under all assignments at once
+with bitsets, and larger ones one assignment at a time, flipping one variable per step.
+
 Parameters
 ----------
 tree : ParseTree
@@ -43,12 +131,21 @@ validity : boolean
 	Whether or not the formula in the tree ParseTree is valid.
 '''
 def brute_force_validity(tree):
-	assignments = {k: False for k in tree.used_variables()}
-	if len(assignments) > 0:
-		for a_permute in range(2 ** len(assignments)):
-			for i, var in enumerate(assignments.keys()):
-				assignments[var] = True if (a_permute & (2 ** i)) != 0 else False
-			if not __eval_node(tree.root, assignments):
+	var_ids = tree.used_variables()
+	if len(var_ids) > 0:
+		flat_tree = tree.flatten()
+		if len(var_ids) <= BITSET_MAX_VARIABLES:
+			truth_table, all_assignments = __eval_tree_bitset(flat_tree, var_ids)
+			return truth_table == all_assignments
+		
+		evaluate = __compile_tree(flat_tree, var_ids)
+		assignments = [False] * len(var_ids)	#Indexed by position in var_ids.
+		if not evaluate(assignments):
+			return False
+		for a_permute in range(1, 2 ** len(var_ids)):	#Steps through a Gray code, so each assignment differs from the last in one variable.
+			i = (a_permute & -a_permute).bit_length() - 1
+			assignments[i] = not assignments[i]
+			if not evaluate(assignments):
 				return False
 	return True
 
@@ -61,8 +158,8 @@ if __name__ == '__main__':
 			brute_valid = brute_force_validity(formula_tree)
 			assert(brute_valid == formula_tree.is_valid()[0])
 			
-			brute_timer = timeit.Timer(lambda: brute_force_validity(formula_tree))
-			ncnf_timer = timeit.Timer(lambda: formula_tree.is_valid())
+			brute_timer = timeit.Timer(lambda: brute_force_validity(formula_tree), setup=formula_tree.clear_cache)	#Both are timed from scratch rather than from the results stored above.
+			ncnf_timer = timeit.Timer(formula_tree.is_valid, setup=formula_tree.clear_cache)
 			
 			if brute_valid:
 				print('Formula IS valid.')